@@ -1,36 +1,46 @@
-from typing import Dict, List, Optional, Union
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+import asyncio
+import hashlib
 import os
+import threading
+from operator import itemgetter
 from pathlib import Path
 
 # Third-party imports
-import torch
 import streamlit as st
-from dotenv import load_dotenv
-from pinecone import Pinecone
-from langchain_mistralai import ChatMistralAI
-from langchain.prompts.chat import ChatPromptTemplate
-from langchain.chains import RetrievalQA
-from langchain_pinecone import PineconeVectorStore
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.runnables import RunnableLambda
-from langchain.prompts import PromptTemplate
-from langchain_core.globals import set_llm_cache
-from langchain_core.caches import InMemoryCache
+from references import reference_key
+from retrieval import astream_query
 from ui import BibleChatUI
 
-# Configure torch properly (replacing deprecated method)
-def configure_torch():
-    """Configure PyTorch settings with latest recommended methods."""
-    torch.set_default_dtype(torch.float32)
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    if hasattr(torch, 'set_default_device'):
-        torch.set_default_device(device)
+# Heavy modules are imported where they are used so the UI paints first
+if TYPE_CHECKING:
+    import httpx
+    from langchain_mistralai import ChatMistralAI
+    from langchain_pinecone import PineconeVectorStore
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.runnables import Runnable
+    from langchain_core.vectorstores import VectorStoreRetriever
+    from embeddings import BatchingEmbeddings
+    from semantic_cache import SQLiteSemanticCache
 
 # Constants
-EMBEDDING_MODEL = 'BAAI/bge-small-en-v1.5'
 PINECONE_INDEX_NAME = "data"
 PINECONE_NAMESPACE = "text_chunks"
-RETRIEVER_K = 4
+RETRIEVER_K = 3
+LLM_MODEL = "mistral-large-latest"
+MISTRAL_API_BASE = "https://api.mistral.ai/v1"
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+PINECONE_POOL_THREADS = 8
+CACHE_DB_PATH = "bible_cache.db"
+SEMANTIC_CACHE_THRESHOLD = 0.95
+# Stricter when no reference or name is cited, e.g. a lowercase "who was peter"
+SEMANTIC_CACHE_UNKEYED_THRESHOLD = 0.98
+SEMANTIC_CACHE_MAX_ENTRIES = 5000
+# Bump when the refinement or answer prompts change so cached answers are dropped
+RESPONSE_CACHE_VERSION = 1
 
 def init_environment() -> None:
     """Initialize environment variables."""
@@ -40,16 +50,21 @@ def init_environment() -> None:
         "PINECONE_ENVIRONMENT"
     ]
     
-    # First try Streamlit secrets
-    if st._is_running_with_streamlit:
+    # First try Streamlit secrets, checking and exporting each in one pass;
+    # load_if_toml_exists returns False without rendering an error
+    if st.secrets.load_if_toml_exists():
         for var in required_vars:
-            if var not in st.secrets:
+            value = st.secrets.get(var)
+            if not value:
                 st.error(f"Missing required secret: {var}")
                 st.info("Please add secrets in Streamlit Cloud dashboard.")
                 st.stop()
+            # TOML secrets may be parsed as non-strings
+            os.environ[var] = str(value)
         return
 
     # Fallback to local .env for development
+    from dotenv import load_dotenv
     load_dotenv()
     missing_vars = [var for var in required_vars if not os.getenv(var)]
     if missing_vars:
@@ -57,12 +72,57 @@ def init_environment() -> None:
         st.info("Please check your .env file.")
         st.stop()
 
+@st.cache_resource(show_spinner=False)
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Start the background event loop shared by all sessions."""
+    # A single long-lived loop keeps pooled async connections usable across reruns
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="async-io", daemon=True).start()
+    return loop
+
+@st.cache_resource(show_spinner=False)
+def get_shared_httpx_client() -> httpx.AsyncClient:
+    """Create the keep-alive HTTP/2 client used for all Mistral requests."""
+    import httpx
+    
+    return httpx.AsyncClient(
+        base_url=MISTRAL_API_BASE,
+        headers={
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization": f"Bearer {os.environ['MISTRAL_API_KEY']}"
+        },
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS),
+        timeout=120
+    )
+
+@st.cache_resource(show_spinner=False)
+def init_embeddings() -> BatchingEmbeddings:
+    """Load the embedding model once per process, shared by every session."""
+    import torch
+    from embeddings import EMBEDDING_CACHE_DIR, EMBEDDING_MODEL, BatchingEmbeddings, load_embeddings
+    
+    # Inference is thread-safe; concurrent queries are batched on the shared loop
+    return BatchingEmbeddings(
+        load_embeddings(
+            EMBEDDING_MODEL,
+            device='cuda' if torch.cuda.is_available() else 'cpu',
+            cache_dir=EMBEDDING_CACHE_DIR
+        ),
+        loop=get_event_loop()
+    )
+
+@st.cache_resource(show_spinner="Loading Bible index...")
 def init_pinecone() -> PineconeVectorStore:
-    """Initialize Pinecone vector store."""
+    """Initialize the Pinecone vector store shared by every session."""
+    from pinecone import Pinecone
+    from langchain_pinecone import PineconeVectorStore
+    
     try:
-        # Get Pinecone credentials from secrets
-        api_key = st.secrets["PINECONE_API_KEY"]
-        environment = st.secrets["PINECONE_ENVIRONMENT"]
+        # Get Pinecone credentials exported by init_environment
+        api_key = os.getenv("PINECONE_API_KEY")
+        environment = os.getenv("PINECONE_ENVIRONMENT")
         
         if not api_key or not environment:
             raise ValueError("Missing Pinecone credentials")
@@ -70,7 +130,8 @@ def init_pinecone() -> PineconeVectorStore:
         # Initialize Pinecone with proper error handling
         pc = Pinecone(
             api_key=api_key,
-            environment=environment
+            environment=environment,
+            pool_threads=PINECONE_POOL_THREADS
         )
         
         # Test connection before proceeding
@@ -81,15 +142,9 @@ def init_pinecone() -> PineconeVectorStore:
         except Exception as e:
             raise ConnectionError(f"Failed to connect to Pinecone index: {str(e)}")
         
-        # Initialize embeddings
-        embedding_function = HuggingFaceEmbeddings(
-            model_name=EMBEDDING_MODEL,
-            model_kwargs={'device': 'cuda' if torch.cuda.is_available() else 'cpu'}
-        )
-        
         return PineconeVectorStore(
             index=index,
-            embedding=embedding_function,
+            embedding=init_embeddings(),
             text_key='text',
             namespace=PINECONE_NAMESPACE
         )
@@ -103,49 +158,126 @@ def init_pinecone() -> PineconeVectorStore:
         st.error(f"Failed to initialize Pinecone: {str(e)}")
         st.stop()
 
+@st.cache_data(show_spinner=False)
+def load_system_prompt() -> str:
+    """Read the system prompt from disk."""
+    return Path("system_prompt.txt").read_text()
+
+@st.cache_resource(show_spinner=False)
 def init_llm(system_prompt: str) -> ChatMistralAI:
     """Initialize the language model."""
-    return ChatMistralAI(
-        model="mistral-large-latest",
+    from langchain_mistralai import ChatMistralAI
+    
+    llm = ChatMistralAI(
+        model=LLM_MODEL,
         model_kwargs={"system_message": system_prompt},
         temperature=0.7,
-        max_tokens=2048
+        max_tokens=2048,
+        streaming=True
     )
+    # validate_environment always builds its own client, so swap ours in afterwards
+    llm.async_client = get_shared_httpx_client()
+    return llm
 
-@st.cache_data(show_spinner=False)
-def process_query(query: str, 
-                 _refinement_chain: RunnableLambda,  # Added underscore to prevent hashing
-                 _retrieval_chain: RetrievalQA) -> str:  # Added underscore to prevent hashing
+def cache_version(system_prompt: str) -> str:
+    """Fingerprint the prompts and models that produce an answer."""
+    from embeddings import EMBEDDING_MODEL
+    
+    fingerprint = "\n".join([
+        str(RESPONSE_CACHE_VERSION), EMBEDDING_MODEL, LLM_MODEL, system_prompt
+    ])
+    return hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+
+@st.cache_resource(show_spinner=False)
+def init_cache(_embedding: Embeddings, version: str) -> SQLiteSemanticCache:  # Added underscore to prevent hashing
+    """Initialize the persistent LLM cache and the semantic response cache."""
+    from langchain_community.cache import SQLiteCache
+    from langchain_core.globals import set_llm_cache
+    from semantic_cache import SQLiteSemanticCache
+    
+    set_llm_cache(SQLiteCache(database_path=CACHE_DB_PATH))
+    return SQLiteSemanticCache(
+        embedding=_embedding,
+        database_path=CACHE_DB_PATH,
+        score_threshold=SEMANTIC_CACHE_THRESHOLD,
+        unkeyed_score_threshold=SEMANTIC_CACHE_UNKEYED_THRESHOLD,
+        version=version,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES
+    )
+
+@st.cache_resource(show_spinner=False)
+def warm_up(_vectorstore: PineconeVectorStore, _llm: ChatMistralAI) -> None:  # Added underscores to prevent hashing
+    """Start one embedding and one LLM call in the background so the first user query starts hot."""
+    # Bypass the persistent LLM cache, which would answer without opening a connection
+    uncached_llm = _llm.copy(update={"cache": False})
+    
+    async def warm_up_all():
+        await asyncio.gather(
+            _vectorstore.embeddings.aembed_query("warmup"),
+            uncached_llm.ainvoke("hello", max_tokens=1),
+            return_exceptions=True
+        )
+    
+    # Fire and forget so page load never waits on the Mistral round-trip
+    asyncio.run_coroutine_threadsafe(warm_up_all(), get_event_loop())
+
+def iterate_async(agen: AsyncIterator[str]) -> Iterator[str]:
+    """Drive an async iterator on the shared event loop from synchronous code."""
+    async def next_item():
+        return await agen.__anext__()
+    
+    loop = get_event_loop()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(next_item(), loop).result()
+        except StopAsyncIteration:
+            return
+
+def process_query(query: str,
+                  refinement_chain: Runnable,
+                  retriever: VectorStoreRetriever,
+                  qa_chain: Runnable,
+                  response_cache: SQLiteSemanticCache) -> Iterator[str]:
     """
-    Process a user query and return the bot's response.
+    Process a user query and stream the bot's response.
+    
+    Repeats and paraphrases of earlier questions are served whole from the
+    persistent semantic cache.
     
     Args:
         query: User's question
-        _refinement_chain: Chain for query refinement (not hashed)
-        _retrieval_chain: Chain for retrieving answers (not hashed)
+        refinement_chain: Chain for query refinement
+        retriever: Retriever for context documents
+        qa_chain: Chain for answering from retrieved documents
+        response_cache: Semantic cache of earlier answers
         
-    Returns:
-        str: Bot's formatted response
+    Yields:
+        str: Chunks of the bot's formatted response
     """
     try:
-        refined_query_msg = _refinement_chain.invoke({"original_question": query})
-        refined_query = (
-            refined_query_msg.get("text", "").strip()
-            if isinstance(refined_query_msg, dict)
-            else getattr(refined_query_msg, 'content', str(refined_query_msg)).strip()
-        )
+        # Embed once for the cache lookup, the first search and the cache update
+        query_vector = retriever.vectorstore.embeddings.embed_query(query)
         
-        response_msg = _retrieval_chain.invoke(refined_query)
-        response = (
-            response_msg.get("result", "")
-            if isinstance(response_msg, dict)
-            else getattr(response_msg, 'content', str(response_msg))
-        )
+        # Questions about different verses or people must never share an answer
+        cache_key = reference_key(query)
+        cached = response_cache.lookup(query, key=cache_key, vector=query_vector)
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
+        for chunk in iterate_async(
+            astream_query(query, query_vector, refinement_chain, retriever, qa_chain)
+        ):
+            chunks.append(chunk)
+            yield chunk
         
-        return response
+        response = "".join(chunks)
+        if response:
+            response_cache.update(query, response, key=cache_key, vector=query_vector)
     except Exception as e:
         st.error(f"Error processing query: {str(e)}")
-        return "I apologize, but I encountered an error processing your question. Please try again."
+        yield "I apologize, but I encountered an error processing your question. Please try again."
 
 def main():
     """Main application entry point."""
@@ -155,46 +287,73 @@ def main():
         ui.setup_ui()
         
         # Initialize model components
+        init_environment()
         vectorstore = init_pinecone()
         retriever = vectorstore.as_retriever(search_kwargs={"k": RETRIEVER_K})
         
         try:
-            system_prompt = Path("system_prompt.txt").read_text()
+            system_prompt = load_system_prompt()
         except FileNotFoundError:
             ui.show_error("System prompt file not found!")
             st.stop()
         
         # Initialize LLM and chains
         llm = init_llm(system_prompt)
-        set_llm_cache(InMemoryCache())
-        refinement_chain, retrieval_chain = initialize_chains(llm, retriever)
+        response_cache = init_cache(init_embeddings(), cache_version(system_prompt))
+        warm_up(vectorstore, llm)
+        refinement_chain, qa_chain = initialize_chains(llm)
         
-        # Handle new user input only
-        user_input = ui.get_user_input()
-        if user_input:
-            # Process only if it's a new message
-            if not st.session_state.messages or user_input != st.session_state.messages[-1].get("content", ""):
-                # Add user message immediately
-                ui.update_chat("user", user_input)
-                
-                # Get and display response
-                with st.spinner("Thinking..."):
-                    response = process_query(user_input, refinement_chain, retrieval_chain)
-                    ui.update_chat("assistant", response)
-                
-                st.rerun()
+        chat(ui, refinement_chain, retriever, qa_chain, response_cache)
                 
     except Exception as e:
         ui.show_error(f"An error occurred: {str(e)}")
         st.stop()
 
-def initialize_chains(llm, retriever):
-    """Initialize the refinement and retrieval chains."""
+@st.fragment
+def chat(ui: BibleChatUI,
+         refinement_chain: Runnable,
+         retriever: VectorStoreRetriever,
+         qa_chain: Runnable,
+         response_cache: SQLiteSemanticCache) -> None:
+    """Render the conversation and answer new input, rerunning only this fragment."""
+    ui.render_chat()
+    
+    # chat_input only returns a value on the run that submitted it
+    user_input = ui.get_user_input()
+    if user_input:
+        # Add and show the user message immediately
+        ui.update_chat("user", user_input)
+        st.chat_message("user").markdown(user_input)
+        
+        # Stream the response as it is generated
+        response = process_query(
+            user_input, refinement_chain, retriever, qa_chain, response_cache
+        )
+        ui.update_chat("assistant", response)
+        
+        st.rerun(scope="fragment")
+
+def format_docs(docs: List[Document]) -> str:
+    """Join retrieved documents into a single context string."""
+    return "\n\n".join(doc.page_content for doc in docs)
+
+@st.cache_resource(show_spinner=False)
+def initialize_chains(_llm: ChatMistralAI):  # Added underscore to prevent hashing
+    """Initialize the refinement and question-answering chains."""
+    from langchain.prompts import PromptTemplate
+    from langchain.prompts.chat import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnableLambda
+    
     refinement_prompt = PromptTemplate(
         input_variables=["original_question"],
-        template="Create a focused Bible search query based on: {original_question}"
+        template=(
+            "Rewrite this question as a short, focused Bible search query. "
+            "Reply with only the query, without quotes or explanation.\n\n"
+            "Question: {original_question}"
+        )
     )
-    refinement_chain = refinement_prompt | llm
+    refinement_chain = refinement_prompt | _llm | StrOutputParser()
     
     retrieval_prompt = ChatPromptTemplate.from_messages([
         ("system", "You are a helpful Bible assistant."),
@@ -206,14 +365,18 @@ def initialize_chains(llm, retriever):
         ))
     ])
     
-    retrieval_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        chain_type_kwargs={"prompt": retrieval_prompt}
+    # Documents are retrieved in process_query so they can be prefetched
+    qa_chain = (
+        {
+            "context": itemgetter("context") | RunnableLambda(format_docs),
+            "question": itemgetter("question")
+        }
+        | retrieval_prompt
+        | _llm
+        | StrOutputParser()
     )
     
-    return refinement_chain, retrieval_chain
+    return refinement_chain, qa_chain
 
 if __name__ == "__main__":
     main()
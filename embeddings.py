@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+EMBEDDING_MODEL = 'BAAI/bge-small-en-v1.5'
+EMBEDDING_CACHE_DIR = Path(__file__).parent / "bge_onnx"
+# O4 adds fp16 mixed precision, which ONNX Runtime only supports on GPU
+ONNX_OPTIMIZATION_LEVEL = "O3"
+ONNX_PROVIDER = "CPUExecutionProvider"
+# Dynamic int8 quantization targeting VNNI dot-product instructions;
+# check retrieval against fp32 with validate_quantization.py after re-exporting
+ONNX_QUANTIZATION_CONFIG = "avx512_vnni"
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """LangChain embeddings interface over an already loaded SentenceTransformer."""
+
+    def __init__(self, model: SentenceTransformer):
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts."""
+        return self.model.encode(list(texts), convert_to_numpy=True).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        return self.embed_documents([text])[0]
+
+class BatchingEmbeddings(Embeddings):
+    """Coalesce concurrent query embeddings into a single batched forward pass."""
+
+    def __init__(self,
+                 embedding: Embeddings,
+                 loop: asyncio.AbstractEventLoop,
+                 max_batch_size: int = 32,
+                 max_wait: float = 0.02,
+                 timeout: float = 60.0):
+        self.embedding = embedding
+        self.loop = loop
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # A dedicated worker: default-executor threads may be blocked in embed_query
+        # waiting on this very batch, so the forward pass must not need one of them
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts directly."""
+        return self.embedding.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query through the batching queue."""
+        if self._on_loop():
+            # Blocking on the loop from inside it would deadlock
+            return self.embedding.embed_query(text)
+        future = asyncio.run_coroutine_threadsafe(self.aembed_query(text), self.loop)
+        try:
+            # Never leave a Streamlit script thread blocked on a lost batch
+            return future.result(self.timeout)
+        finally:
+            future.cancel()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Queue a query and wait for the batch containing it."""
+        if not self._on_loop():
+            return await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(self.aembed_query(text), self.loop)
+            )
+        if self._worker is None or self._worker.done():
+            self._start_worker()
+        future = self.loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    def _on_loop(self) -> bool:
+        """Return True if called from the batching event loop."""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _start_worker(self) -> None:
+        """Start the batch worker, or restart it after it stopped."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        # The loop only keeps a weak reference to tasks
+        self._worker = self.loop.create_task(self._process_batches())
+        self._worker.add_done_callback(self._on_worker_done)
+
+    def _on_worker_done(self, worker: asyncio.Task) -> None:
+        """Fail every queued query so no caller waits on a stopped worker."""
+        if worker is not self._worker:
+            # A replacement worker already drains the queue
+            return
+        error = RuntimeError("Embedding worker stopped")
+        if not worker.cancelled():
+            error.__cause__ = worker.exception()
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(error)
+
+    async def _process_batches(self) -> None:
+        """Drain the queue in batches of up to max_batch_size or max_wait seconds."""
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                deadline = self.loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - self.loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                texts = [text for text, _ in batch]
+                # Run the forward pass off the loop so network I/O keeps flowing
+                vectors = await self.loop.run_in_executor(
+                    self._executor, self.embedding.embed_documents, texts
+                )
+                if len(vectors) != len(texts):
+                    raise ValueError(f"Got {len(vectors)} embeddings for {len(texts)} texts")
+            except BaseException as e:
+                # Fail the whole batch, and still stop if the worker is cancelled
+                error = e if isinstance(e, Exception) else RuntimeError("Embedding worker stopped")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                if not isinstance(e, Exception):
+                    raise
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+def load_onnx_model(model_name: str, cache_dir: Path) -> SentenceTransformer:
+    """Load a graph-optimized, int8-quantized ONNX model, exporting it to cache_dir on first use."""
+    from sentence_transformers import (
+        SentenceTransformer,
+        export_dynamic_quantized_onnx_model,
+        export_optimized_onnx_model
+    )
+
+    optimized_file = f"onnx/model_{ONNX_OPTIMIZATION_LEVEL}.onnx"
+    quantized_file = f"onnx/model_qint8_{ONNX_QUANTIZATION_CONFIG}.onnx"
+    if not (cache_dir / optimized_file).exists():
+        model = SentenceTransformer(
+            model_name,
+            backend="onnx",
+            model_kwargs={"provider": ONNX_PROVIDER}
+        )
+        model.save_pretrained(str(cache_dir))
+        export_optimized_onnx_model(model, ONNX_OPTIMIZATION_LEVEL, str(cache_dir))
+
+    if not (cache_dir / quantized_file).exists():
+        optimized = SentenceTransformer(
+            str(cache_dir),
+            backend="onnx",
+            model_kwargs={"file_name": optimized_file, "provider": ONNX_PROVIDER}
+        )
+        export_dynamic_quantized_onnx_model(optimized, ONNX_QUANTIZATION_CONFIG, str(cache_dir))
+
+    return SentenceTransformer(
+        str(cache_dir),
+        backend="onnx",
+        model_kwargs={"file_name": quantized_file, "provider": ONNX_PROVIDER}
+    )
+
+def load_compiled_model(model_name: str, device: str) -> SentenceTransformer:
+    """Load a PyTorch model with fused attention kernels compiled by Inductor."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device=device)
+    transformer = model[0].auto_model
+    try:
+        from optimum.bettertransformer import BetterTransformer
+        transformer = BetterTransformer.transform(transformer)
+    except (ImportError, NotImplementedError, ValueError):
+        # Recent transformers releases already route BERT attention through SDPA
+        pass
+
+    # Inductor applies these options through config.patch for this model only.
+    # Dynamic shapes keep new query lengths from triggering a recompile; CUDA
+    # graphs (mode="reduce-overhead") are left off because they would still
+    # record and keep a new graph for every distinct padded length.
+    # Compilation is triggered by the app's warmup embedding
+    model[0].auto_model = torch.compile(
+        transformer,
+        dynamic=True,
+        fullgraph=False,
+        options={"coordinate_descent_tuning": True}
+    )
+    return model
+
+def load_embeddings(model_name: str, device: str, cache_dir: Path) -> SentenceTransformerEmbeddings:
+    """Load the embedding model, using ONNX Runtime on CPU and torch.compile on GPU."""
+    if device == "cpu":
+        model = load_onnx_model(model_name, cache_dir)
+    else:
+        model = load_compiled_model(model_name, device)
+    return SentenceTransformerEmbeddings(model)
@@ -0,0 +1,82 @@
+import re
+from typing import Dict, List, Optional
+
+VERSE_REFERENCE_RE = re.compile(r"\b[1-3]?\s?[A-Z][a-z]+\s\d+:\d+\b")
+# Any word followed by a chapter, verse or verse range, e.g. "psalm 23", "John 3:16-18"
+CHAPTER_VERSE_RE = re.compile(
+    # The lookahead keeps "Explain 1 John 4:8" from reading "Explain 1" as a citation
+    r"\b([1-3]?\s?[a-z]+)\.?\s+(\d+(?::\d+)?(?:-\d+)?)\b(?!\s?[a-z]+\.?\s+\d)",
+    re.IGNORECASE
+)
+
+BIBLE_BOOKS = (
+    "Genesis", "Exodus", "Leviticus", "Numbers", "Deuteronomy", "Joshua", "Judges",
+    "Ruth", "1 Samuel", "2 Samuel", "1 Kings", "2 Kings", "1 Chronicles",
+    "2 Chronicles", "Ezra", "Nehemiah", "Esther", "Job", "Psalms", "Proverbs",
+    "Ecclesiastes", "Song of Solomon", "Isaiah", "Jeremiah", "Lamentations", "Ezekiel",
+    "Daniel", "Hosea", "Joel", "Amos", "Obadiah", "Jonah", "Micah", "Nahum",
+    "Habakkuk", "Zephaniah", "Haggai", "Zechariah", "Malachi", "Matthew", "Mark",
+    "Luke", "John", "Acts", "Romans", "1 Corinthians", "2 Corinthians", "Galatians",
+    "Ephesians", "Philippians", "Colossians", "1 Thessalonians", "2 Thessalonians",
+    "1 Timothy", "2 Timothy", "Titus", "Philemon", "Hebrews", "James", "1 Peter",
+    "2 Peter", "1 John", "2 John", "3 John", "Jude", "Revelation"
+)
+BOOK_ALIASES = {
+    "Psalm": "Psalms",
+    "Song of Songs": "Song of Solomon"
+}
+
+def _normalize(name: str) -> str:
+    """Return a spacing- and case-insensitive lookup key for a book name."""
+    return "".join(name.split()).lower()
+
+def _book_pattern(name: str) -> str:
+    """Return a regex for a book name, allowing '1John' as well as '1 John'."""
+    number, _, rest = name.partition(" ")
+    if number.isdigit():
+        return number + r"\s?" + r"\s+".join(rest.split())
+    return r"\s+".join(name.split())
+
+_CANONICAL_BOOKS: Dict[str, str] = {_normalize(book): book for book in BIBLE_BOOKS}
+_CANONICAL_BOOKS.update({_normalize(alias): book for alias, book in BOOK_ALIASES.items()})
+
+# Longest names first so "1 John" wins over "John" and "Psalms" over "Psalm"
+_BOOK_NAMES_PATTERN = "|".join(
+    _book_pattern(name)
+    for name in sorted(list(BIBLE_BOOKS) + list(BOOK_ALIASES), key=len, reverse=True)
+)
+BOOK_REFERENCE_RE = re.compile(
+    r"\b(?P<book>" + _BOOK_NAMES_PATTERN + r")\s+\d+:\d+",
+    re.IGNORECASE
+)
+BOOK_NAME_RE = re.compile(r"\b(?:" + _BOOK_NAMES_PATTERN + r")\b", re.IGNORECASE)
+SENTENCE_RE = re.compile(r"[^.?!]+")
+CAPITALIZED_WORD_RE = re.compile(r"\b[A-Z][a-z]+\b")
+
+def extract_book(query: str) -> Optional[str]:
+    """Return the canonical Bible book named in a verse reference, if any."""
+    match = BOOK_REFERENCE_RE.search(query)
+    if not match:
+        return None
+    return _CANONICAL_BOOKS[_normalize(match.group("book"))]
+
+def extract_names(query: str) -> List[str]:
+    """Return the Bible books and capitalized proper nouns named in the query, normalized."""
+    names = {
+        _normalize(_CANONICAL_BOOKS[_normalize(book)]) for book in BOOK_NAME_RE.findall(query)
+    }
+    for sentence in SENTENCE_RE.findall(BOOK_NAME_RE.sub(" ", query)):
+        # A sentence's first word is capitalized whether or not it is a name
+        names.update(
+            match.group().lower()
+            for match in CAPITALIZED_WORD_RE.finditer(sentence)
+            if sentence[:match.start()].strip()
+        )
+    return sorted(names)
+
+def reference_key(query: str) -> str:
+    """Return the citations, books and names in the query as a normalized exact-match key."""
+    citations = [
+        f"{_normalize(word)} {number}" for word, number in CHAPTER_VERSE_RE.findall(query)
+    ]
+    return ";".join(citations + extract_names(query))
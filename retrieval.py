@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import re
+from functools import partial
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Tuple
+
+from references import VERSE_REFERENCE_RE, extract_book
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_core.runnables import Runnable
+    from langchain_core.vectorstores import VectorStoreRetriever
+
+# Only enable once the index stores a canonical book name on every chunk
+BOOK_FILTER_ENABLED = False
+BOOK_METADATA_KEY = "book"
+REFINEMENT_OVERLAP_THRESHOLD = 0.5
+SHORT_QUERY_MAX_WORDS = 8
+RETRIEVAL_SCORE_THRESHOLD = 0.85
+
+def needs_refinement(query: str) -> bool:
+    """Return True unless the query is short or cites a verse directly."""
+    return len(query.split()) > SHORT_QUERY_MAX_WORDS and not VERSE_REFERENCE_RE.search(query)
+
+async def asearch(retriever: VectorStoreRetriever,
+                  query: str,
+                  query_vector: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+    """Search the index, filtering server-side by book when enabled and the query cites one."""
+    vectorstore = retriever.vectorstore
+    search_kwargs = dict(retriever.search_kwargs)
+    book = extract_book(query) if BOOK_FILTER_ENABLED else None
+    if book:
+        search_kwargs["filter"] = {BOOK_METADATA_KEY: book}
+    
+    # Embed on the loop so no executor thread sits blocked waiting for a batch
+    if query_vector is None:
+        query_vector = await vectorstore.embeddings.aembed_query(query)
+    return await asyncio.get_running_loop().run_in_executor(
+        None,
+        partial(vectorstore.similarity_search_by_vector_with_score, query_vector, **search_kwargs)
+    )
+
+def is_material_refinement(original: str, refined: str) -> bool:
+    """Return True if too few of the refined query's terms appear in the original."""
+    # Word tokens only, so "us?" matches "us" and quoted LLM output still compares
+    original_terms = set(re.findall(r"\w+", original.lower()))
+    refined_terms = set(re.findall(r"\w+", refined.lower()))
+    if not original_terms or not refined_terms:
+        return bool(refined_terms)
+    # Measured against the refined terms only: dropping the question's filler
+    # words ("what does the ... say about") is not a material change
+    overlap = len(original_terms & refined_terms) / len(refined_terms)
+    return overlap < REFINEMENT_OVERLAP_THRESHOLD
+
+async def astream_query(query: str,
+                        query_vector: List[float],
+                        refinement_chain: Runnable,
+                        retriever: VectorStoreRetriever,
+                        qa_chain: Runnable) -> AsyncIterator[str]:
+    """
+    Refine the query and prefetch documents concurrently, then stream the answer.
+    
+    Refinement is skipped for queries that are already good search queries:
+    short questions, explicit verse references, or queries whose top match
+    clears RETRIEVAL_SCORE_THRESHOLD.
+    
+    Args:
+        query: User's question
+        query_vector: Embedding of the question, reused for the first search
+        refinement_chain: Chain for query refinement
+        retriever: Retriever used to fetch context documents
+        qa_chain: Stuff-documents chain that answers from the context
+        
+    Yields:
+        str: Chunks of the bot's formatted response
+    """
+    refined_query = query
+    if not needs_refinement(query):
+        docs = [doc for doc, _ in await asearch(retriever, query, query_vector)]
+    else:
+        refinement = asyncio.ensure_future(
+            refinement_chain.ainvoke({"original_question": query})
+        )
+        try:
+            scored_docs = await asearch(retriever, query, query_vector)
+            docs = [doc for doc, _ in scored_docs]
+            
+            if not scored_docs or scored_docs[0][1] < RETRIEVAL_SCORE_THRESHOLD:
+                refined_query = (await refinement).strip().strip('"')
+                
+                # Only pay for a second retrieval when refinement changed the query
+                if refined_query and is_material_refinement(query, refined_query):
+                    docs = [doc for doc, _ in await asearch(retriever, refined_query)]
+                else:
+                    refined_query = query
+        finally:
+            # No-op once awaited; otherwise a good first match or a failed search
+            # must not leave the refinement call running
+            refinement.cancel()
+    
+    async for chunk in qa_chain.astream({"context": docs, "question": refined_query}):
+        yield chunk
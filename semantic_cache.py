@@ -0,0 +1,141 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+class SQLiteSemanticCache:
+    """Persistent query -> answer cache matched by embedding similarity.
+
+    Each entry carries an exact-match key (e.g. the verse references and names
+    in the query); a lookup only considers entries stored under the same key.
+    Entries are tagged with a version identifying the prompt and models that
+    produced them, and the oldest entries are evicted past max_entries.
+    """
+
+    def __init__(self,
+                 embedding: Embeddings,
+                 database_path: Union[str, Path] = "semantic_cache.db",
+                 score_threshold: float = 0.95,
+                 unkeyed_score_threshold: Optional[float] = None,
+                 version: str = "",
+                 max_entries: int = 5000):
+        self.embedding = embedding
+        self.score_threshold = score_threshold
+        # Queries with an empty key differ only in wording the key cannot see
+        self.unkeyed_score_threshold = unkeyed_score_threshold or score_threshold
+        self.version = version
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Streamlit serves sessions from several threads
+        self._conn = sqlite3.connect(str(database_path), check_same_thread=False)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(semantic_cache)")}
+        if columns and "version" not in columns:
+            # The cache is disposable, so tables from older releases are recreated
+            self._conn.execute("DROP TABLE semantic_cache")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "version TEXT NOT NULL, "
+            "query TEXT NOT NULL, "
+            "key TEXT NOT NULL DEFAULT '', "
+            "embedding BLOB NOT NULL, "
+            "answer TEXT NOT NULL)"
+        )
+        # Answers from another prompt or model can never be served again
+        self._conn.execute("DELETE FROM semantic_cache WHERE version != ?", (version,))
+        self._conn.commit()
+        self._load()
+
+    def _reset(self) -> None:
+        """Empty the in-memory ring of entries."""
+        self._ids: List[int] = [0] * self.max_entries
+        self._keys = np.empty(self.max_entries, dtype=object)
+        self._answers: List[str] = [""] * self.max_entries
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        self._next = 0
+
+    def _load(self) -> None:
+        """Read the newest max_entries entries into memory for vectorised lookups."""
+        self._reset()
+        rows = self._conn.execute(
+            "SELECT id, key, embedding, answer FROM semantic_cache ORDER BY id DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        if not rows:
+            return
+        rows.reverse()
+        # Evict anything beyond the cap, e.g. after it was lowered
+        self._conn.execute("DELETE FROM semantic_cache WHERE id < ?", (rows[0][0],))
+        self._conn.commit()
+        for row_id, key, blob, answer in rows:
+            self._store(row_id, key, np.frombuffer(blob, dtype=np.float32), answer)
+
+    def _store(self, row_id: int, key: str, vector: np.ndarray, answer: str) -> None:
+        """Write an entry into the next ring slot, overwriting the oldest once full."""
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+        slot = self._next
+        self._ids[slot] = row_id
+        self._keys[slot] = key
+        self._answers[slot] = answer
+        self._matrix[slot] = vector
+        self._next = (slot + 1) % self.max_entries
+        self._size = min(self._size + 1, self.max_entries)
+
+    def _embed(self, query: str, vector: Optional[Sequence[float]] = None) -> np.ndarray:
+        """L2-normalise a query embedding, computing it unless given, so dot products are cosine scores."""
+        if vector is None:
+            vector = self.embedding.embed_query(query)
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self,
+               query: str,
+               key: str = "",
+               vector: Optional[Sequence[float]] = None) -> Optional[str]:
+        """Return the cached answer of the nearest stored query with the same key, if close enough."""
+        vector = self._embed(query, vector)
+        threshold = self.score_threshold if key else self.unkeyed_score_threshold
+        with self._lock:
+            if not self._size:
+                return None
+            candidates = np.flatnonzero(self._keys[:self._size] == key)
+            if not candidates.size:
+                return None
+            scores = self._matrix[candidates] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                return self._answers[candidates[best]]
+        return None
+
+    def update(self,
+               query: str,
+               answer: str,
+               key: str = "",
+               vector: Optional[Sequence[float]] = None) -> None:
+        """Store an answer for a query under an exact-match key, evicting the oldest entry when full."""
+        vector = self._embed(query, vector)
+        with self._lock:
+            if self._size == self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM semantic_cache WHERE id = ?", (self._ids[self._next],)
+                )
+            cursor = self._conn.execute(
+                "INSERT INTO semantic_cache (version, query, key, embedding, answer) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.version, query, key, vector.tobytes(), answer)
+            )
+            self._conn.commit()
+            self._store(cursor.lastrowid, key, vector, answer)
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM semantic_cache")
+            self._conn.commit()
+            self._reset()
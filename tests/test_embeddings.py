@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from embeddings import BatchingEmbeddings
+
+
+class RecordingEmbeddings:
+    """Embeds a text to its length and records each batch it receives."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    # A small default executor, as on a low-core host
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=4))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+
+    async def cancel_tasks():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(cancel_tasks(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
+
+
+def test_embed_query_from_plain_thread(loop):
+    embedding = BatchingEmbeddings(RecordingEmbeddings(), loop)
+    assert embedding.embed_query("abc") == [3.0]
+
+
+def test_concurrent_queries_are_batched(loop):
+    base = RecordingEmbeddings()
+    embedding = BatchingEmbeddings(base, loop, max_wait=0.05)
+
+    async def embed_all():
+        return await asyncio.gather(*(embedding.aembed_query("x" * i) for i in range(10)))
+
+    vectors = asyncio.run_coroutine_threadsafe(embed_all(), loop).result(timeout=5)
+    assert vectors == [[float(i)] for i in range(10)]
+    assert len(base.batches) < 10
+
+
+def test_saturated_default_executor_does_not_deadlock(loop):
+    """More blocking embed_query callers than default-executor workers must still finish."""
+    embedding = BatchingEmbeddings(RecordingEmbeddings(), loop)
+
+    async def search_all():
+        # Mirrors langchain's executor-based async search calling sync embed_query
+        return await asyncio.gather(*(
+            loop.run_in_executor(None, embedding.embed_query, "x" * i) for i in range(8)
+        ))
+
+    vectors = asyncio.run_coroutine_threadsafe(search_all(), loop).result(timeout=5)
+    assert vectors == [[float(i)] for i in range(8)]
+
+
+def test_forward_pass_errors_reach_every_caller(loop):
+    class FailingEmbeddings(RecordingEmbeddings):
+        def embed_documents(self, texts):
+            raise RuntimeError("model failed")
+
+    embedding = BatchingEmbeddings(FailingEmbeddings(), loop)
+    with pytest.raises(RuntimeError, match="model failed"):
+        embedding.embed_query("abc")
+
+
+def test_short_forward_pass_fails_instead_of_hanging(loop):
+    class DroppingEmbeddings(RecordingEmbeddings):
+        def embed_documents(self, texts):
+            return super().embed_documents(texts)[:-1]
+
+    embedding = BatchingEmbeddings(DroppingEmbeddings(), loop, timeout=5)
+    with pytest.raises(ValueError, match="0 embeddings for 1 texts"):
+        embedding.embed_query("abc")
+
+
+def test_stopped_worker_fails_pending_queries_and_restarts(loop):
+    started, release = threading.Event(), threading.Event()
+
+    class BlockingEmbeddings(RecordingEmbeddings):
+        def embed_documents(self, texts):
+            started.set()
+            release.wait(5)
+            return super().embed_documents(texts)
+
+    embedding = BatchingEmbeddings(BlockingEmbeddings(), loop, timeout=5)
+    in_flight = asyncio.run_coroutine_threadsafe(embedding.aembed_query("a"), loop)
+    assert started.wait(5)
+    queued = asyncio.run_coroutine_threadsafe(embedding.aembed_query("bb"), loop)
+
+    loop.call_soon_threadsafe(embedding._worker.cancel)
+    for future in (in_flight, queued):
+        with pytest.raises(RuntimeError, match="worker stopped"):
+            future.result(timeout=5)
+
+    release.set()
+    assert embedding.embed_query("ccc") == [3.0]
+
+
+def test_embed_query_times_out(loop):
+    release = threading.Event()
+
+    class StuckEmbeddings(RecordingEmbeddings):
+        def embed_documents(self, texts):
+            release.wait(5)
+            return super().embed_documents(texts)
+
+    embedding = BatchingEmbeddings(StuckEmbeddings(), loop, timeout=0.1)
+    with pytest.raises(TimeoutError):
+        embedding.embed_query("abc")
+    release.set()
@@ -0,0 +1,54 @@
+import pytest
+
+from references import extract_book, reference_key
+
+
+@pytest.mark.parametrize("query, book", [
+    ("What does John 3:16 mean?", "John"),
+    ("Explain 1 John 4:8", "1 John"),
+    ("Explain 1John 4:8", "1 John"),
+    ("What is Psalm 23:1 about?", "Psalms"),
+    ("Compare Psalms 91:1 and 91:2", "Psalms"),
+    ("Song of Solomon 2:1", "Song of Solomon"),
+    ("song of songs 2:1", "Song of Solomon"),
+    ("Explain Romans 8:28", "Romans"),
+    ("Paul wrote Romans 8:28", "Romans"),
+    ("what does john 3:16 mean", "John"),
+])
+def test_extract_book(query, book):
+    assert extract_book(query) == book
+
+
+@pytest.mark.parametrize("query", [
+    "Who was Moses?",
+    "Tell me about John the Baptist",
+    "What does Moses 3:1 say?",
+    "Read John 3",
+])
+def test_extract_book_without_reference(query):
+    assert extract_book(query) is None
+
+
+@pytest.mark.parametrize("first, second", [
+    ("What does John 3:16 mean?", "What does John 3:17 mean?"),
+    ("Explain Psalm 23", "Explain Psalm 24"),
+    ("Explain 1 John 4:8", "Explain 2 John 4:8"),
+    ("Explain John 3:16", "Explain John 3:16-18"),
+    ("Who was Moses?", "Explain John 3:16"),
+    ("Who was Peter?", "Who was Paul?"),
+    ("What did Jesus say about prayer?", "What did Paul say about prayer?"),
+    ("Summarize romans", "Summarize galatians"),
+])
+def test_reference_key_distinguishes_citations(first, second):
+    assert reference_key(first) != reference_key(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("What does John 3:16 mean?", "what is the meaning of john 3:16"),
+    ("Explain 1John 4:8", "Explain 1 John 4:8"),
+    ("Who was Moses?", "Tell me about Moses"),
+    ("Summarize Romans", "summarize romans"),
+    ("Why did Peter deny Jesus?", "Why did Peter deny Jesus three times?"),
+])
+def test_reference_key_matches_same_citations(first, second):
+    assert reference_key(first) == reference_key(second)
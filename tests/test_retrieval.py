@@ -0,0 +1,177 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import retrieval
+from retrieval import astream_query, is_material_refinement, needs_refinement
+
+LONG_QUERY = "What does the Bible say about forgiving people who hurt us?"
+
+
+class StubEmbeddings:
+    """Embeds a text to a one-element vector holding the text itself."""
+
+    def __init__(self):
+        self.texts = []
+
+    async def aembed_query(self, text):
+        self.texts.append(text)
+        return [text]
+
+
+class StubVectorStore:
+    """Returns fixed (document, score) results per query text and records each search."""
+
+    def __init__(self, results=None, error=None):
+        self.embeddings = StubEmbeddings()
+        self.results = results or {}
+        self.error = error
+        self.searches = []
+
+    def similarity_search_by_vector_with_score(self, embedding, **kwargs):
+        self.searches.append((embedding, kwargs))
+        if self.error:
+            raise self.error
+        return self.results.get(embedding[0], [])
+
+
+class StubRefinementChain:
+    """Returns a fixed refinement, or waits until cancelled when given none."""
+
+    def __init__(self, refined=None):
+        self.refined = refined
+        self.calls = 0
+        self.cancelled = False
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        if self.refined is None:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+        return self.refined
+
+
+class StubQAChain:
+    """Streams a fixed answer and records the inputs it was given."""
+
+    def __init__(self):
+        self.inputs = None
+
+    async def astream(self, inputs):
+        self.inputs = inputs
+        for chunk in ("An ", "answer."):
+            yield chunk
+
+
+def stream(query, store, refinement_chain):
+    """Run astream_query to completion and return the QA chain's inputs."""
+    retriever = SimpleNamespace(vectorstore=store, search_kwargs={"k": 3})
+    qa_chain = StubQAChain()
+
+    async def run():
+        try:
+            return [
+                chunk async for chunk in astream_query(
+                    query, [query], refinement_chain, retriever, qa_chain
+                )
+            ]
+        finally:
+            # Let a cancelled refinement task finish, then check none was left
+            # running; asyncio.run would otherwise cancel it on shutdown
+            await asyncio.sleep(0)
+            assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    assert asyncio.run(run()) == ["An ", "answer."]
+    return qa_chain.inputs
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Who was Moses?", False),
+    ("What does John 3:16 mean for people who doubt their faith?", False),
+    (LONG_QUERY, True),
+])
+def test_needs_refinement(query, expected):
+    assert needs_refinement(query) is expected
+
+
+@pytest.mark.parametrize("refined, expected", [
+    ("Bible forgiveness forgive people who hurt us", False),
+    ('"What does the Bible say about forgiving people who hurt us?"', False),
+    ("Matthew 18 seventy times seven", True),
+    ("", False),
+])
+def test_is_material_refinement(refined, expected):
+    assert is_material_refinement(LONG_QUERY, refined) is expected
+
+
+def test_short_query_skips_refinement():
+    store = StubVectorStore({"Who was Moses?": [("moses", 0.5)]})
+    refinement_chain = StubRefinementChain("Moses prophet")
+
+    inputs = stream("Who was Moses?", store, refinement_chain)
+
+    assert refinement_chain.calls == 0
+    assert inputs == {"context": ["moses"], "question": "Who was Moses?"}
+    # The precomputed vector is searched directly, without re-embedding
+    assert store.embeddings.texts == []
+
+
+def test_good_first_match_cancels_refinement():
+    store = StubVectorStore({LONG_QUERY: [("forgive", 0.9), ("other", 0.4)]})
+    refinement_chain = StubRefinementChain()
+
+    inputs = stream(LONG_QUERY, store, refinement_chain)
+
+    assert refinement_chain.cancelled
+    assert len(store.searches) == 1
+    assert inputs == {"context": ["forgive", "other"], "question": LONG_QUERY}
+
+
+def test_material_refinement_searches_again():
+    refined = "Matthew 18 seventy times seven"
+    store = StubVectorStore({
+        LONG_QUERY: [("weak", 0.5)],
+        refined: [("matthew", 0.9)],
+    })
+
+    inputs = stream(LONG_QUERY, store, StubRefinementChain(f' "{refined}" \n'))
+
+    assert store.embeddings.texts == [refined]
+    assert inputs == {"context": ["matthew"], "question": refined}
+
+
+def test_immaterial_refinement_keeps_prefetched_documents():
+    store = StubVectorStore({LONG_QUERY: [("weak", 0.5)]})
+
+    inputs = stream(
+        LONG_QUERY, store, StubRefinementChain("Bible forgiveness forgive people who hurt us")
+    )
+
+    assert len(store.searches) == 1
+    assert inputs == {"context": ["weak"], "question": LONG_QUERY}
+
+
+def test_failed_search_cancels_refinement():
+    store = StubVectorStore(error=ConnectionError("index unavailable"))
+    refinement_chain = StubRefinementChain()
+
+    with pytest.raises(ConnectionError):
+        stream(LONG_QUERY, store, refinement_chain)
+
+    assert refinement_chain.cancelled
+
+
+def test_book_filter_applies_only_when_enabled(monkeypatch):
+    store = StubVectorStore()
+    stream("What does John 3:16 mean?", store, StubRefinementChain())
+    monkeypatch.setattr(retrieval, "BOOK_FILTER_ENABLED", True)
+    stream("What does John 3:16 mean?", store, StubRefinementChain())
+
+    assert [kwargs for _, kwargs in store.searches] == [
+        {"k": 3},
+        {"k": 3, "filter": {"book": "John"}},
+    ]
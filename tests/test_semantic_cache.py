@@ -0,0 +1,132 @@
+import sqlite3
+
+import pytest
+
+from semantic_cache import SQLiteSemanticCache
+
+
+class StubEmbeddings:
+    """Embeds known texts to fixed vectors."""
+
+    vectors = {
+        "who was moses": [1.0, 0.0, 0.0],
+        "tell me about moses": [0.99, 0.1, 0.0],
+        "who was david": [0.7, 0.7, 0.0],
+        "who was peter": [0.6, 0.0, 0.8],
+        "who was paul": [0.58, 0.0, 0.81],
+        "what does john 3:16 mean": [0.0, 0.0, 1.0],
+        "what does john 3:17 mean": [0.0, 0.01, 1.0],
+    }
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLiteSemanticCache(StubEmbeddings(), tmp_path / "cache.db", score_threshold=0.95)
+
+
+def test_lookup_empty_cache_misses(cache):
+    assert cache.lookup("who was moses") is None
+
+
+def test_lookup_returns_exact_and_paraphrase_hits(cache):
+    cache.update("who was moses", "A prophet.")
+    assert cache.lookup("who was moses") == "A prophet."
+    assert cache.lookup("tell me about moses") == "A prophet."
+
+
+def test_lookup_below_threshold_misses(cache):
+    cache.update("who was moses", "A prophet.")
+    assert cache.lookup("who was david") is None
+
+
+def test_lookup_requires_matching_key(cache):
+    cache.update("what does john 3:16 mean", "God so loved the world.", key="john 3:16")
+    assert cache.lookup("what does john 3:17 mean", key="john 3:17") is None
+    assert cache.lookup("what does john 3:17 mean") is None
+    assert cache.lookup("what does john 3:16 mean", key="john 3:16") == "God so loved the world."
+
+
+def test_lookup_picks_best_entry_within_key(cache):
+    cache.update("who was david", "A king.")
+    cache.update("who was moses", "A prophet.")
+    assert cache.lookup("tell me about moses") == "A prophet."
+
+
+def test_entries_persist_across_instances(tmp_path):
+    path = tmp_path / "cache.db"
+    SQLiteSemanticCache(StubEmbeddings(), path).update("who was moses", "A prophet.", key="k")
+    reloaded = SQLiteSemanticCache(StubEmbeddings(), path)
+    assert reloaded.lookup("tell me about moses", key="k") == "A prophet."
+
+
+def test_clear_removes_entries(cache):
+    cache.update("who was moses", "A prophet.")
+    cache.clear()
+    assert cache.lookup("who was moses") is None
+
+
+def test_unkeyed_lookup_uses_stricter_threshold(tmp_path):
+    cache = SQLiteSemanticCache(
+        StubEmbeddings(), tmp_path / "cache.db", score_threshold=0.95, unkeyed_score_threshold=0.9999
+    )
+    cache.update("who was peter", "An apostle.")
+    assert cache.lookup("who was paul") is None
+    assert cache.lookup("who was peter") == "An apostle."
+
+    cache.update("who was peter", "An apostle.", key="peter")
+    assert cache.lookup("who was paul", key="peter") == "An apostle."
+
+
+def test_oldest_entries_are_evicted(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = SQLiteSemanticCache(StubEmbeddings(), path, max_entries=2)
+    cache.update("who was moses", "A prophet.")
+    cache.update("who was david", "A king.")
+    cache.update("what does john 3:16 mean", "God so loved the world.")
+
+    assert cache.lookup("who was moses") is None
+    assert cache.lookup("who was david") == "A king."
+    assert cache.lookup("what does john 3:16 mean") == "God so loved the world."
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM semantic_cache").fetchone() == (2,)
+
+
+def test_lowering_the_cap_keeps_newest_entries(tmp_path):
+    path = tmp_path / "cache.db"
+    cache = SQLiteSemanticCache(StubEmbeddings(), path)
+    for query in ("who was moses", "who was david", "what does john 3:16 mean"):
+        cache.update(query, query.upper())
+
+    reloaded = SQLiteSemanticCache(StubEmbeddings(), path, max_entries=2)
+    assert reloaded.lookup("who was moses") is None
+    assert reloaded.lookup("who was david") == "WHO WAS DAVID"
+
+    reloaded.update("who was moses", "A prophet.")
+    assert reloaded.lookup("who was david") is None
+    assert reloaded.lookup("what does john 3:16 mean") == "WHAT DOES JOHN 3:16 MEAN"
+
+
+def test_entries_from_another_version_are_dropped(tmp_path):
+    path = tmp_path / "cache.db"
+    SQLiteSemanticCache(StubEmbeddings(), path, version="v1").update("who was moses", "A prophet.")
+    assert SQLiteSemanticCache(StubEmbeddings(), path, version="v2").lookup("who was moses") is None
+    assert SQLiteSemanticCache(StubEmbeddings(), path, version="v1").lookup("who was moses") is None
+
+
+def test_table_from_older_release_is_recreated(tmp_path):
+    path = tmp_path / "cache.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE semantic_cache (id INTEGER PRIMARY KEY, query TEXT, embedding BLOB, answer TEXT)")
+    conn.commit()
+
+    cache = SQLiteSemanticCache(StubEmbeddings(), path)
+    cache.update("who was moses", "A prophet.")
+    assert cache.lookup("who was moses") == "A prophet."
+
+
+def test_precomputed_vector_skips_embedding(cache):
+    # The stub raises KeyError for texts it does not know
+    cache.update("unseen question", "An answer.", vector=[0.0, 2.0, 0.0])
+    assert cache.lookup("another unseen question", vector=[0.0, 1.0, 0.0]) == "An answer."
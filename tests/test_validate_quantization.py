@@ -0,0 +1,22 @@
+import numpy as np
+
+from validate_quantization import compare_query_embeddings, passes
+
+
+def test_identical_embeddings_pass():
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(5, 8))
+    passages = rng.normal(size=(10, 8))
+    report = compare_query_embeddings(queries, queries.copy(), passages, k=4)
+    assert report["min_cosine"] > 0.999
+    assert report["mean_top_k_overlap"] == 1.0
+    assert passes(report)
+
+
+def test_drifted_embeddings_fail():
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(5, 8))
+    passages = rng.normal(size=(10, 8))
+    report = compare_query_embeddings(queries, -queries, passages, k=4)
+    assert report["min_cosine"] < 0
+    assert not passes(report)
@@ -1,7 +1,21 @@
 import streamlit as st
-from typing import Callable, Dict, Any
+from collections import deque
+from typing import Callable, Dict, Any, Iterator, Union
 from datetime import datetime
 
+MAX_CHAT_MESSAGES = 50
+VISIBLE_CHAT_MESSAGES = 20
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _greeting_for_hour(hour: int) -> str:
+    """Return the greeting for an hour of the day."""
+    if hour < 12:
+        return "Good Morning"
+    elif hour < 17:
+        return "Good Afternoon"
+    else:
+        return "Good Evening"
+
 class BibleChatUI:
     def __init__(self):
         self.initialize_session_state()
@@ -10,19 +24,13 @@ class BibleChatUI:
     def initialize_session_state():
         """Initialize session state variables."""
         if "messages" not in st.session_state:
-            st.session_state.messages = []
+            st.session_state.messages = deque(maxlen=MAX_CHAT_MESSAGES)
         if "chat_history" not in st.session_state:
             st.session_state.chat_history = []
 
     def get_greeting(self) -> str:
         """Return appropriate greeting based on time of day."""
-        hour = datetime.now().hour
-        if hour < 12:
-            return "Good Morning"
-        elif hour < 17:
-            return "Good Afternoon"
-        else:
-            return "Good Evening"
+        return _greeting_for_hour(datetime.now().hour)
 
     def setup_ui(self):
         """Setup the main UI components."""
@@ -37,7 +45,7 @@ class BibleChatUI:
                        unsafe_allow_html=True)
             st.markdown("")
             if st.button("New Chat", use_container_width=True):
-                st.session_state.messages = []
+                st.session_state.messages = deque(maxlen=MAX_CHAT_MESSAGES)
                 st.session_state.chat_history = []
                 st.rerun()
             
@@ -64,6 +72,8 @@ class BibleChatUI:
                 - Explain the Lord's Prayer
                 """)
 
+    def render_chat(self):
+        """Render the chat history and input."""
         # Single container for all chat content
         with st.container():
             # Display chat history
@@ -82,23 +92,38 @@ class BibleChatUI:
     def display_chat_history(self):
         """Display chat messages from history."""
         if "messages" not in st.session_state:
-            st.session_state.messages = []
-            
-        # Display only from session state
-        for msg in st.session_state.messages:
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"])
+            st.session_state.messages = deque(maxlen=MAX_CHAT_MESSAGES)
+        
+        # Collapse older messages so each rerun renders a bounded number
+        messages = list(st.session_state.messages)
+        earlier = messages[:-VISIBLE_CHAT_MESSAGES]
+        if earlier:
+            with st.expander("Earlier in this conversation"):
+                for msg in earlier:
+                    self.render_message(msg)
+        
+        for msg in messages[-VISIBLE_CHAT_MESSAGES:]:
+            self.render_message(msg)
 
-    def update_chat(self, role: str, content: str):
-        """Update chat history with new message."""
-        # Prevent duplicate messages
+    def render_message(self, msg: Dict[str, str]):
+        """Render a single chat message."""
+        # st.markdown is parsed in the browser, so there is no server-side parse
+        # to cache, and it matches how st.write_stream renders the live answer
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
+    def update_chat(self, role: str, content: Union[str, Iterator[str]]) -> str:
+        """Update chat history with new message, streaming it if given an iterator."""
         if "messages" not in st.session_state:
-            st.session_state.messages = []
-            
-        # Only add if not already present
-        msg = {"role": role, "content": content}
-        if msg not in st.session_state.messages:
-            st.session_state.messages.append(msg)
+            st.session_state.messages = deque(maxlen=MAX_CHAT_MESSAGES)
+        
+        # Render streamed content as it arrives and keep the full text
+        if not isinstance(content, str):
+            with st.chat_message(role):
+                content = st.write_stream(content)
+        
+        st.session_state.messages.append({"role": role, "content": content})
+        return content
 
     def show_error(self, error: str):
         """Display error message."""
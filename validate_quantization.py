@@ -0,0 +1,116 @@
+"""Check that int8 query embeddings retrieve like the fp32 ones the index was built with.
+
+Run before shipping a re-exported model:
+
+    python validate_quantization.py
+
+Exits non-zero if query embeddings drift or top-k retrieval overlap drops
+below the thresholds.
+
+MIN_COSINE and MIN_TOP_K_OVERLAP are starting points that have not yet
+been measured against the real fp32 and int8 models. Record the numbers
+from the first run here and tighten or relax the thresholds to match.
+"""
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+MIN_COSINE = 0.98
+MIN_TOP_K_OVERLAP = 0.9
+TOP_K = 4
+
+SAMPLE_QUERIES = [
+    "What does John 3:16 mean?",
+    "Who was Moses?",
+    "What is the story of creation?",
+    "Explain the Lord's Prayer",
+    "What does the Bible say about forgiveness?",
+    "Why did David fight Goliath?",
+    "What are the fruits of the Spirit?",
+    "What happened at Pentecost?",
+    "How should Christians treat their enemies?",
+    "What is faith according to Hebrews?",
+]
+
+SAMPLE_PASSAGES = [
+    "For God so loved the world, that he gave his only begotten Son, that whosoever believeth in him should not perish, but have everlasting life.",
+    "In the beginning God created the heaven and the earth.",
+    "And God said, Let there be light: and there was light.",
+    "Now Moses kept the flock of Jethro his father in law, the priest of Midian.",
+    "And Moses stretched out his hand over the sea; and the LORD caused the sea to go back.",
+    "Our Father which art in heaven, Hallowed be thy name.",
+    "Give us this day our daily bread. And forgive us our debts, as we forgive our debtors.",
+    "Then came Peter to him, and said, Lord, how oft shall my brother sin against me, and I forgive him?",
+    "Then said David to the Philistine, Thou comest to me with a sword, and with a spear, and with a shield.",
+    "But the fruit of the Spirit is love, joy, peace, longsuffering, gentleness, goodness, faith.",
+    "And when the day of Pentecost was fully come, they were all with one accord in one place.",
+    "And they were all filled with the Holy Ghost, and began to speak with other tongues.",
+    "But I say unto you, Love your enemies, bless them that curse you, do good to them that hate you.",
+    "Now faith is the substance of things hoped for, the evidence of things not seen.",
+    "The LORD is my shepherd; I shall not want.",
+    "Blessed are the meek: for they shall inherit the earth.",
+]
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise rows so dot products are cosine scores."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def compare_query_embeddings(reference: np.ndarray,
+                             candidate: np.ndarray,
+                             passages: np.ndarray,
+                             k: int = TOP_K) -> Dict[str, float]:
+    """
+    Compare candidate query embeddings against reference ones.
+
+    Args:
+        reference: Query embeddings from the un-quantized model
+        candidate: Embeddings of the same queries from the quantized model
+        passages: Passage embeddings from the un-quantized model, as in the index
+        k: Number of passages retrieved per query
+
+    Returns:
+        Dict[str, float]: Mean/min query cosine and mean top-k overlap
+    """
+    reference, candidate, passages = map(_normalize, (reference, candidate, passages))
+    cosines = np.sum(reference * candidate, axis=1)
+    reference_top = np.argsort(-(reference @ passages.T), axis=1)[:, :k]
+    candidate_top = np.argsort(-(candidate @ passages.T), axis=1)[:, :k]
+    overlaps = [
+        len(set(ref) & set(cand)) / k
+        for ref, cand in zip(reference_top, candidate_top)
+    ]
+    return {
+        "mean_cosine": float(np.mean(cosines)),
+        "min_cosine": float(np.min(cosines)),
+        "mean_top_k_overlap": float(np.mean(overlaps)),
+    }
+
+def passes(report: Dict[str, float]) -> bool:
+    """Return True if a comparison report clears the shipping thresholds."""
+    return report["min_cosine"] >= MIN_COSINE and report["mean_top_k_overlap"] >= MIN_TOP_K_OVERLAP
+
+def main(queries: List[str] = SAMPLE_QUERIES, passages: List[str] = SAMPLE_PASSAGES) -> int:
+    from sentence_transformers import SentenceTransformer
+    from embeddings import EMBEDDING_CACHE_DIR, EMBEDDING_MODEL, load_onnx_model
+
+    fp32 = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    int8 = load_onnx_model(EMBEDDING_MODEL, EMBEDDING_CACHE_DIR)
+
+    report = compare_query_embeddings(
+        fp32.encode(queries),
+        int8.encode(queries),
+        fp32.encode(passages)
+    )
+    for name, value in report.items():
+        print(f"{name}: {value:.4f}")
+
+    if not passes(report):
+        print(f"FAIL: need min_cosine >= {MIN_COSINE} and mean_top_k_overlap >= {MIN_TOP_K_OVERLAP}")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())